@@ -1,32 +1,264 @@
+import argparse
+import errno
 import os
 import shutil
+import stat
+import sys
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from typing import Callable, Optional
 from ui import ConsoleUI
-from futils import FileSelector, FileExplorer, FileSystem, FileManager
+from futils import DEFAULT_WORKERS, FileSelector, FileExplorer, FileSystem, FileManager
+
+try:
+    import readline  # provided by pyreadline3 on Windows
+except ImportError:
+    readline = None
+
+
+BLOCKSIZE = 1 << 20
+COPY_RANGE_SIZE = 2**31 - 1
+# Errors meaning "this kernel copy primitive cannot handle these files", not real I/O failures
+_UNSUPPORTED_COPY_ERRNOS = {errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int) -> int:
+    """Copy a chunk inside the kernel, possibly as a reflink or server-side copy"""
+    return os.copy_file_range(src_fd, dst_fd, COPY_RANGE_SIZE, offset, offset)
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int) -> int:
+    """Copy a chunk through the page cache without going through user space"""
+    return os.sendfile(dst_fd, src_fd, offset, BLOCKSIZE)
+
+
+# sendfile only accepts a regular file as output on Linux (elsewhere it needs a socket), as in shutil
+_KERNEL_COPIES = [copy for copy, available in ((_copy_file_range, hasattr(os, 'copy_file_range')),
+                                               (_sendfile, sys.platform.startswith('linux')))
+                  if available]
+
+
+def _copy_data(src: str, dest_path: str) -> None:
+    """Copy the contents of src to dest_path without going through user space when possible"""
+    if os.name == 'nt':
+        import ctypes
+        if not ctypes.windll.kernel32.CopyFileW(src, dest_path, False):
+            raise ctypes.WinError()
+        return
+    # O_NONBLOCK so that opening a named pipe returns at once instead of waiting for a writer or reader
+    src_fd = os.open(src, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        src_st = os.fstat(src_fd)
+        if stat.S_ISDIR(src_st.st_mode):
+            raise IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR), src)
+        if stat.S_ISFIFO(src_st.st_mode):
+            raise shutil.SpecialFileError(f"`{src}` is a named pipe")
+        os.set_blocking(src_fd, True)
+        try:
+            dst_fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_NONBLOCK, 0o644)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+            # A named pipe without reader
+            raise shutil.SpecialFileError(f"`{dest_path}` is a named pipe") from e
+        try:
+            dst_st = os.fstat(dst_fd)
+            if stat.S_ISFIFO(dst_st.st_mode):
+                raise shutil.SpecialFileError(f"`{dest_path}` is a named pipe")
+            os.set_blocking(dst_fd, True)
+            if (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+                raise shutil.SameFileError(f"{src!r} and {dest_path!r} are the same file")
+            os.ftruncate(dst_fd, 0)
+            offset = 0
+            for kernel_copy in _KERNEL_COPIES:
+                os.lseek(dst_fd, offset, os.SEEK_SET)
+                try:
+                    while (copied := kernel_copy(src_fd, dst_fd, offset)):
+                        offset += copied
+                    break
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                        raise
+            else:
+                # No kernel copy applies to these files: finish with a buffered copy
+                os.lseek(src_fd, offset, os.SEEK_SET)
+                os.lseek(dst_fd, offset, os.SEEK_SET)
+                with open(src_fd, 'rb', closefd=False) as fsrc, open(dst_fd, 'wb', closefd=False) as fdst:
+                    shutil.copyfileobj(fsrc, fdst, BLOCKSIZE)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+
+def _prefetch_metadata(paths: list[str]) -> dict[str, os.stat_result]:
+    """Stat the given paths with one directory scan per parent instead of one lookup per path"""
+    by_parent: dict[str, set[str]] = {}
+    for path in paths:
+        parent, name = os.path.split(path)
+        by_parent.setdefault(parent, set()).add(name)
+    metadata = {}
+    for parent, names in by_parent.items():
+        try:
+            with os.scandir(parent) as it:
+                for entry in it:
+                    if entry.name in names:
+                        metadata[entry.path] = entry.stat(follow_symlinks=False)
+        except OSError:
+            pass  # Left to the file operations, which report their own errors
+    return metadata
+
+
+# Like shutil.rmtree, work relative to directory descriptors where possible so that a folder
+# swapped for a symlink during the walk cannot redirect the removal outside the tree
+_RMTREE_USES_FD = ({os.open, os.unlink, os.rmdir} <= os.supports_dir_fd and os.scandir in os.supports_fd)
+_DIR_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_NOFOLLOW', 0)
+
+
+def _is_reparse_point(st: os.stat_result) -> bool:
+    """Whether a Windows folder is a junction or directory link, to be removed without entering it"""
+    return bool(getattr(st, 'st_file_attributes', 0) & stat.FILE_ATTRIBUTE_REPARSE_POINT)
+
+
+def _rmtree_parallel(path: str, pool: Executor) -> None:
+    """Remove a directory tree bottom-up, unlinking the files of each directory in parallel"""
+    # Each frame is [directory (fd or path), name, parent directory, subfolders left to visit, pending removals]
+    stack = [[os.open(path, _DIR_FLAGS) if _RMTREE_USES_FD else path, path, None, None, []]]
+    try:
+        while stack:
+            frame = stack[-1]
+            directory, name, parent, subdirs, removals = frame
+            if subdirs is None:
+                frame[3] = []
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        target = entry.name if _RMTREE_USES_FD else entry.path
+                        dir_fd = directory if _RMTREE_USES_FD else None
+                        if not entry.is_dir(follow_symlinks=False):
+                            removals.append(pool.submit(os.unlink, target, dir_fd=dir_fd))
+                        elif os.name == 'nt' and _is_reparse_point(entry.stat(follow_symlinks=False)):
+                            removals.append(pool.submit(os.rmdir, target))
+                        else:
+                            frame[3].append(entry.name)
+            elif subdirs:
+                child = subdirs.pop()
+                if _RMTREE_USES_FD:
+                    stack.append([os.open(child, _DIR_FLAGS, dir_fd=directory), child, directory, None, []])
+                else:
+                    stack.append([os.path.join(directory, child), child, directory, None, []])
+            else:
+                for removal in removals:
+                    removal.result()
+                stack.pop()
+                if _RMTREE_USES_FD:
+                    os.close(directory)
+                    if parent is None:
+                        os.rmdir(name)
+                    else:
+                        os.rmdir(name, dir_fd=parent)
+                else:
+                    os.rmdir(directory)
+    finally:
+        for directory, _, _, _, removals in stack:
+            wait(removals)
+            if _RMTREE_USES_FD:
+                os.close(directory)
 
 
 class StdFileSystem(FileSystem):
-    def copy(src: str, dest: str) -> None:
-        """Copy a file from src to dest"""
-        if os.path.exists(src):
-            shutil.copy2(src, dest)
+    def __init__(self, max_workers: int=None):
+        # Kept apart from FileManager's pool: its workers block on these unlinks
+        self._unlink_pool = ThreadPoolExecutor(max_workers=max_workers or DEFAULT_WORKERS)
+
+    @staticmethod
+    def copy(src: str, dest: str, dest_is_dir: bool=None) -> None:
+        """Copy a file from src to dest, dest_is_dir spares checking dest when the caller already knows"""
+        if dest_is_dir is None:
+            dest_is_dir = os.path.isdir(dest)
+        dest_path = os.path.join(dest, os.path.basename(src)) if dest_is_dir else dest
+        try:
+            _copy_data(src, dest_path)
+        except FileNotFoundError as e:
+            if e.filename != src:
+                raise
+            return
+        shutil.copystat(src, dest_path)
 
+    @staticmethod
     def move(src: str, dest: str) -> None:
         """Move a file from src to dest"""
-        if os.path.exists(src):
-            shutil.move(src, dest)
+        try:
+            # shutil.move already renames in place on the same device, only the cross-device copy needs speeding up
+            shutil.move(src, dest, copy_function=StdFileSystem.copy)
+        except FileNotFoundError as e:
+            if e.filename != src:
+                raise
 
-    def delete(path: str) -> None:
-        """Delete a file"""
-        if os.path.isfile(path):
+    def delete(self, path: str, path_stat: os.stat_result=None) -> None:
+        """Delete a file, path_stat spares its lstat when already known"""
+        try:
+            path_stat = path_stat or os.lstat(path)
+        except FileNotFoundError:
+            return
+        if not stat.S_ISDIR(path_stat.st_mode):
             os.remove(path)
-        elif os.path.isdir(path):
-            shutil.rmtree(path)
+        elif _is_reparse_point(path_stat):
+            os.rmdir(path)
+        else:
+            _rmtree_parallel(path, self._unlink_pool)
+
+    @staticmethod
+    def prefetch_metadata(paths: list[str]) -> dict[str, os.stat_result]:
+        """Return the lstat of the given paths that still exist, when a directory scan provides it for free"""
+        # Only Windows fills DirEntry.stat() from the scan, elsewhere it costs one lstat per file on top of the scan
+        return _prefetch_metadata(paths) if os.name == 'nt' else {}
+
+
+def _path_completer() -> Callable[[str, int], Optional[str]]:
+    """Build a readline completer for file system paths, relative ones starting from the working directory"""
+    matches = []
+    def complete(text: str, state: int) -> Optional[str]:
+        if state == 0:
+            head, tail = os.path.split(text)
+            try:
+                with os.scandir(os.path.expanduser(head) or os.curdir) as it:
+                    matches[:] = [os.path.join(head, entry.name) + (os.sep if entry.is_dir() else '')
+                                  for entry in it if entry.name.startswith(tail)]
+            except OSError:
+                matches.clear()
+        return matches[state] if state < len(matches) else None
+    return complete
+
+
+def _input_path(prompt: str) -> str:
+    """Read a path, completing it with tab when readline is available"""
+    if readline is None:
+        return input(prompt)
+    readline.set_completer(_path_completer())
+    try:
+        return input(prompt)
+    finally:
+        readline.set_completer(None)
+
+
+def _setup_console() -> None:
+    """Write UTF-8 in large blocks so emoji never go through the encoding error fallback"""
+    if os.name == 'nt':
+        import ctypes
+        ctypes.windll.kernel32.SetConsoleOutputCP(65001)
+    if hasattr(sys.stdout, 'reconfigure'):
+        # input() flushes stdout before reading, so prompts are still shown in time
+        sys.stdout.reconfigure(encoding='utf-8', errors='replace', line_buffering=False)
 
 
-def main_menu():
+def main_menu(max_workers: int=None):
+    _setup_console()
     file_selector = FileSelector()
-    file_manager = FileManager(file_selector, StdFileSystem(), ConsoleUI())
+    file_manager = FileManager(file_selector, StdFileSystem(max_workers), ConsoleUI(), max_workers)
     file_explorer = FileExplorer()
+    if readline is not None:
+        readline.parse_and_bind('tab: complete')
+        # The whole answer is one path: do not split it on separators
+        readline.set_completer_delims('')
     
     while True:
         print("\n--- File Explorer ---")
@@ -54,21 +286,27 @@ def main_menu():
             
             elif choice == '4':
                 file_explorer.display_directory_contents()
-                indices = input("Enter file indices to select (comma-separated): ")
+                indices = input("Enter file indices to select (comma-separated, ranges like 2-5): ")
                 file_selector.select_files_by_indices(indices, file_explorer)
             
             elif choice == '5':
-                dest = input("Enter destination path for copying: ")
+                dest = _input_path("Enter destination path for copying: ")
+                touched = file_selector.selected_files + [dest]
                 count = file_manager.copy_files(dest)
+                file_explorer.invalidate(touched)
                 print(f"{count} file(s) copied")
 
             elif choice == '6':
-                dest = input("Enter destination path for moving: ")
+                dest = _input_path("Enter destination path for moving: ")
+                touched = file_selector.selected_files + [dest]
                 count = file_manager.move_files(dest)
+                file_explorer.invalidate(touched)
                 print(f"{count} file(s) moved")
             
             elif choice == '7':
+                touched = list(file_selector.selected_files)
                 count = file_manager.delete_files()
+                file_explorer.invalidate(touched)
                 print(f"{count} file(s)/folder(s) deleted")
             
             elif choice == '8':
@@ -83,4 +321,8 @@ def main_menu():
 
 
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Console file manager")
+    parser.add_argument('-c', '--max-concurrency', type=int, default=None,
+                        help="number of files processed concurrently (default: $FMGR_WORKERS or 8)")
+    args = parser.parse_args()
+    main_menu(args.max_concurrency)
\ No newline at end of file
@@ -1,25 +1,47 @@
 import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Callable
 from ui import UserInterface
 
+DEFAULT_WORKERS = int(os.environ.get('FMGR_WORKERS', '8'))
+LISTING_TTL = float(os.environ.get('FMGR_LISTING_TTL', '5'))
+LISTING_CACHE_SIZE = int(os.environ.get('FMGR_LISTING_CACHE_SIZE', '256'))
+_WS_TRANS = str.maketrans('', '', ' \t')
+
+
 class FileListProvider:
     def subset(indices: list[int]) -> list[str]:
         pass
 
+    def __len__() -> int:
+        pass
+
 
 class FileSelection:
     def get_and_reset() -> list[str]:
         pass
 
+    def __len__() -> int:
+        pass
+
 
 class FileSystem:
-    def copy(src: str, dest: str) -> None:
+    @staticmethod
+    def copy(src: str, dest: str, dest_is_dir: bool=None) -> None:
         pass
 
+    @staticmethod
     def move(src: str, dest: str) -> None:
         pass
 
-    def delete(path: str) -> None:
+    def delete(self, path: str, path_stat: os.stat_result=None) -> None:
+        pass
+
+    @staticmethod
+    def prefetch_metadata(paths: list[str]) -> dict[str, os.stat_result]:
         pass
 
 
@@ -30,13 +52,19 @@ class FileSelector(FileSelection):
     def select_files_by_indices(self, indices: list[int], file_explorer: FileListProvider) -> list[str]:
         """Select files based on indices"""
         try:
-            selected_indices = [int(i.strip()) for i in indices.split(',')]
+            count = len(file_explorer)
+            selected_indices = []
+            for token in indices.translate(_WS_TRANS).split(','):
+                start, sep, end = token.partition('-')
+                if sep and start:
+                    # Clamped to the listing so a typo like 0-1000000000 stays cheap
+                    selected_indices.extend(range(max(int(start), 0), min(int(end) + 1, count)))
+                else:
+                    selected_indices.append(int(token))
             
             self.selected_files = file_explorer.subset(selected_indices)
             
-            print("Selected files:")
-            for file in self.selected_files:
-                print(f" - {os.path.basename(file)}")
+            sys.stdout.write("Selected files:\n" + "".join(f" - {file[file.rfind(os.sep) + 1:]}\n" for file in self.selected_files))
             
             return self.selected_files
         except ValueError:
@@ -46,31 +74,84 @@ class FileSelector(FileSelection):
             print(f"Error selecting files: {e}")
             return []
  
+    def __len__(self) -> int:
+        """Number of currently selected files"""
+        return len(self.selected_files)
+
     def get_and_reset(self) -> list[str]:
         """Return the list of currently selected files"""
-        res = self.selected_files.copy()
-        self.selected_files.clear()
+        res, self.selected_files = self.selected_files, []
         return res
 
 
 class FileExplorer(FileListProvider):
     def __init__(self):
+        self._listing_cache: OrderedDict[str, tuple[float, int, list[tuple[str, bool]]]] = OrderedDict()
         self._set_current_path(os.path.expanduser('~'))
 
+    def _list_directory(self, path: str) -> list[tuple[str, bool]]:
+        """Return the (name, is_dir) entries of a directory, reusing the cached listing while valid"""
+        key = os.path.abspath(path)
+        now = time.monotonic()
+        cached = self._listing_cache.get(key)
+        if cached is not None:
+            self._listing_cache.move_to_end(key)
+            if now - cached[0] < LISTING_TTL:
+                return cached[2]
+        mtime_ns = os.stat(key).st_mtime_ns
+        if cached is not None and cached[1] == mtime_ns:
+            entries = cached[2]
+        else:
+            with os.scandir(key) as it:
+                # d_type only: a symlink to a folder is listed as a file rather than paying a stat
+                entries = [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in it]
+        self._listing_cache[key] = (now, mtime_ns, entries)
+        if len(self._listing_cache) > LISTING_CACHE_SIZE:
+            self._listing_cache.popitem(last=False)
+        return entries
+
     def _set_current_path(self, path: str) -> None:
-        """Set current path and update the contents of the current directory"""
+        """Set current path, its contents are listed on first access"""
         self.current_path = path
-        self.current_directory_contents = os.listdir(self.current_path)
+        self._prefix = sys.intern(os.path.join(path, ''))
+        self._dirty = True
+
+    @property
+    def _entries(self) -> list[tuple[str, bool]]:
+        """(name, is_dir) entries of the current directory"""
+        if self._dirty:
+            self._current_entries = self._list_directory(self.current_path)
+            self._dirty = False
+        return self._current_entries
+
+    def invalidate(self, paths: list[str]) -> None:
+        """Drop cached listings of the given paths, of everything under them and of their parent directories"""
+        paths = [os.path.abspath(path) for path in paths]
+        parents = {os.path.dirname(path) for path in paths}
+        prefixes = tuple(os.path.join(path, '') for path in paths)
+        for key in [key for key in self._listing_cache if key in parents or (key + os.sep).startswith(prefixes)]:
+            del self._listing_cache[key]
+        if os.path.abspath(self.current_path) not in self._listing_cache:
+            self._dirty = True
+
+    def __len__(self) -> int:
+        """Number of elements in the current directory"""
+        return len(self._entries)
+
+    @property
+    def current_directory_contents(self) -> list[str]:
+        """Names of the elements of the current directory"""
+        return [name for name, _ in self._entries]
 
     def display_directory_contents(self) -> None:
         """Display contents of the current directory"""
         try:
-            print(f"\nCurrent Directory: {self.current_path}")
-            print("-" * 50)
-            for index, element in enumerate(self.current_directory_contents):
-                full_path = os.path.join(self.current_path, element)
-                element_type = "📁 Folder" if os.path.isdir(full_path) else "📄 File"
-                print(f"{index}. {element_type}: {element}")
+            lines = [f"\nCurrent Directory: {self.current_path}", "-" * 50]
+            for index, (element, is_dir) in enumerate(self._entries):
+                element_type = "📁 Folder" if is_dir else "📄 File"
+                lines.append(f"{index}. {element_type}: {element}")
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
         except PermissionError:
             print("Access denied to this directory.")
         except Exception as e:
@@ -79,10 +160,10 @@ class FileExplorer(FileListProvider):
     def navigate(self, index: int) -> None:
         """Navigate to a subdirectory"""
         try:
-            selected_element = self.current_directory_contents[index]
+            selected_element, is_dir = self._entries[index]
             full_path = os.path.join(self.current_path, selected_element)
             
-            if os.path.isdir(full_path):
+            if is_dir or os.path.isdir(full_path):
                 self._set_current_path(full_path)
                 self.display_directory_contents()
             else:
@@ -97,39 +178,57 @@ class FileExplorer(FileListProvider):
 
     def subset(self, indices: list[int]) -> list[str]:
         """Return a subset of the current directory contents"""
-        selected_files = []
-        for index in indices:
-            if 0 <= index < len(self.current_directory_contents):
-                full_path = os.path.join(self.current_path, self.current_directory_contents[index])
-                selected_files.append(full_path)
-        return selected_files
+        entries = self._entries
+        count = len(entries)
+        prefix = self._prefix
+        return [prefix + entries[index][0] for index in dict.fromkeys(indices) if 0 <= index < count]
 
 
 class FileManager:
-    def __init__(self, sel: FileSelection, fs: FileSystem, ui: UserInterface):
+    def __init__(self, sel: FileSelection, fs: FileSystem, ui: UserInterface, max_workers: int=None):
         self.sel = sel
         self.fs = fs
         self.ui = ui
+        self._copy, self._move, self._delete = fs.copy, fs.move, fs.delete
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or DEFAULT_WORKERS)
         
-    def _process_files(self, title: str, action: Callable[[str, str], None], destination: str=None) -> int:
-        """Process files based on the action"""
+    def _process_files(self, title: str, action: Callable[[str, str, bool, os.stat_result], None], destination: str=None, prefetch: bool=False) -> int:
+        """Process files concurrently based on the action, return the number of files processed"""
         try:
+            if destination == '':
+                # abspath would silently turn it into the working directory
+                raise ValueError("no destination given")
+            # Resolved once for the whole batch instead of once per file
+            dest_is_dir = destination is not None and os.path.isdir(destination)
+            if destination is not None:
+                if not dest_is_dir and len(self.sel) > 1:
+                    # Concurrent writes to one target would interleave instead of overwriting
+                    raise ValueError(f"destination must be a folder to receive {len(self.sel)} files")
+                destination = os.path.abspath(destination)
             selected_files = self.sel.get_and_reset()
-            for file in selected_files:
-                action(file, destination)
-            return len(selected_files)
+            metadata = (self.fs.prefetch_metadata(selected_files) if prefetch else None) or {}
+            futures = [self._pool.submit(action, file, destination, dest_is_dir, metadata.get(file)) for file in selected_files]
+            wait(futures)
+            count = 0
+            for file, future in zip(selected_files, futures):
+                error = future.exception()
+                if error is None:
+                    count += 1
+                else:
+                    self.ui.error(f"{title} {os.path.basename(file)}: {error}")
+            return count
         except Exception as e:
             self.ui.error(f"{title}: {e}")
             return 0
         
     def copy_files(self, destination) -> int:
         """Copy selected files"""
-        return self._process_files("Copy", self.fs.copy, destination)
+        return self._process_files("Copy", lambda src, dest, dest_is_dir, _ : self._copy(src, dest, dest_is_dir), destination)
 
     def move_files(self, destination) -> int:
         """Move selected files"""
-        return self._process_files("Move", self.fs.move, destination)
+        return self._process_files("Move", lambda src, dest, _, __ : self._move(src, dest), destination)
 
     def delete_files(self) -> int:
         """Delete selected files"""
-        return self._process_files("Delete", action=lambda path, _ : self.fs.delete(path))
+        return self._process_files("Delete", action=lambda path, _, __, path_stat : self._delete(path, path_stat), prefetch=True)
@@ -1,8 +1,10 @@
 class UserInterface:
+    @staticmethod
     def error(msg: str) -> None:
         pass
 
 
 class ConsoleUI(UserInterface):
+    @staticmethod
     def error(msg: str) -> None:
         print(msg)